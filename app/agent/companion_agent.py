@@ -1,19 +1,62 @@
 """AI伴侣代理模块"""
 import os
+import re
+import json
 import logging
 import asyncio
-from typing import Dict, Any, List, Optional
+import hashlib
+from typing import Dict, Any, List, Optional, AsyncIterator, Tuple
 from datetime import datetime
 
+import diskcache
+import httpx
 from openai import AsyncOpenAI
 from pydantic import BaseModel, Field
 
 from app.core.memory import Memory
 from app.core.state import StateManager
 from app.core.speech import SpeechProcessor
+from config.settings import USER_CONFIG, LLM_CACHE
 
 logger = logging.getLogger(__name__)
 
+# 按中文/英文句末标点和换行切分句子，连续的句末标点（如"？！"）归入同一句
+SENTENCE_PATTERN = re.compile(r'[^。！？!?\n]*[。！？!?\n]+')
+# 含有文字或数字的片段才有可朗读的内容
+SPEAKABLE_PATTERN = re.compile(r'\w')
+
+def _append_sentence(sentences: List[str], fragment: str):
+    """追加一个句子；纯标点片段并入前一句，没有前一句时丢弃"""
+    fragment = fragment.strip()
+    if not fragment:
+        return
+    if SPEAKABLE_PATTERN.search(fragment):
+        sentences.append(fragment)
+    elif sentences:
+        sentences[-1] += fragment
+
+def split_sentences(text: str, final: bool = False) -> Tuple[List[str], str]:
+    """把文本切分为完整句子，返回 (句子列表, 尚未切分的剩余文本)
+
+    非 final 时，恰好位于文本末尾的句子先不切出，因为下一个流式分块可能紧跟着更多句末标点；
+    final 时剩余文本也作为最后一句输出。
+    """
+    sentences: List[str] = []
+    consumed = 0
+    for match in SENTENCE_PATTERN.finditer(text):
+        if not final and match.end() == len(text):
+            break
+        consumed = match.end()
+        _append_sentence(sentences, match.group())
+    if final:
+        _append_sentence(sentences, text[consumed:])
+        consumed = len(text)
+    return sentences, text[consumed:]
+
+# API不可用时返回的兜底回复，不能写入回复缓存
+UNAVAILABLE_REPLY = "抱歉，AI服务暂时不可用。请确保DEEPSEEK_API_KEY环境变量已设置。"
+NETWORK_ERROR_REPLY = "对不起，我现在遇到了一些网络问题，能稍后再聊吗？"
+
 class AgentState(BaseModel):
     """代理状态"""
     messages: List[Dict[str, Any]] = Field(default_factory=list)
@@ -31,16 +74,33 @@ class CompanionAgent:
         self.state_manager = state_manager
         self.speech_processor = speech_processor
         
+        # 记忆写入队列：由后台任务每隔 FLUSH_INTERVAL 秒批量落盘，
+        # 避免SQLite提交阻塞对话主流程
+        self.FLUSH_INTERVAL = 0.5
+        self._write_q: Optional[asyncio.Queue] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._pending_writes: List[tuple] = []
+        
         # 初始化 OpenAI 客户端
         api_key = os.getenv('DEEPSEEK_API_KEY')
         if not api_key:
             logger.warning("没有找到DEEPSEEK_API_KEY环境变量，将无法使用AI功能")
             self.client = None
         else:    
+            # httpx 默认空闲5秒就关闭连接，而两轮对话间隔通常更长，
+            # 延长保活时间以便每轮复用同一个TLS连接
             self.client = AsyncOpenAI(
                 api_key=api_key,
                 base_url="https://api.deepseek.com/v1",
-                timeout=60.0  # 设置更长的超时时间
+                timeout=60.0,  # 设置更长的超时时间
+                http_client=httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_connections=10,
+                        max_keepalive_connections=10,
+                        keepalive_expiry=120.0
+                    ),
+                    timeout=60.0
+                )
             )
         
         # 系统提示词
@@ -49,19 +109,100 @@ class CompanionAgent:
         你应该关注用户的兴趣和情绪状态，并据此调整回应。
         你的回答应该简洁明了，避免过长解释。"""
         
+        # 用户画像以稳定的JSON追加到系统提示词末尾，使每次请求的前缀完全一致，
+        # 从而命中DeepSeek的上下文硬盘缓存；动态内容只放在后续消息中
+        self.system_prompt += "\n\n用户信息：" + json.dumps(
+            USER_CONFIG.to_dict(), ensure_ascii=False, sort_keys=True, separators=(",", ":")
+        )
+        
         # 对话历史
         self.messages: List[Dict[str, str]] = []
         
+        # 回复缓存：以完整请求消息（系统提示词含用户画像 + 最近历史 + 当前输入）的哈希为键，
+        # 只做精确匹配，"你好"、"再见"这类重复开场可直接返回，无需请求API
+        self.reply_cache = diskcache.Cache(
+            str(LLM_CACHE['dir']),
+            size_limit=LLM_CACHE['size_limit']
+        )
+        
         # 网络错误重试配置
         self.max_retries = 3
         self.retry_delay = 1  # 初始延迟1秒
         
         logger.info("AI伴侣代理初始化完成")
     
+    async def warmup(self):
+        """预热：提前建立HTTPS连接，并用固定的系统提示词填充DeepSeek前缀缓存"""
+        if not self.client:
+            return
+        try:
+            await self.client.chat.completions.create(
+                model="deepseek-chat",
+                messages=[
+                    {"role": "system", "content": self.system_prompt},
+                    {"role": "user", "content": "你好"}
+                ],
+                max_tokens=1
+            )
+            logger.info("AI服务预热完成")
+        except Exception as e:
+            logger.warning(f"AI服务预热失败: {e}")
+    
+    async def aclose(self):
+        """写出未落盘的记忆并关闭与API的HTTP连接"""
+        if self._flush_task:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        if self._write_q:
+            self._drain_write_queue()
+        if self._pending_writes:
+            # 退出阶段直接同步写入，确保最后几轮对话不丢失
+            batch, self._pending_writes = self._pending_writes, []
+            self.memory.add_memories_bulk(batch)
+        if self.client:
+            await self.client.close()
+    
+    def _enqueue_memory(self, memory_type: str, content: str, metadata: Dict[str, Any]):
+        """把记忆放入写入队列，按需启动后台写入任务"""
+        if self._write_q is None:
+            self._write_q = asyncio.Queue()
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+        self._write_q.put_nowait((memory_type, content, metadata))
+    
+    def _drain_write_queue(self):
+        """把队列中已有的记忆全部取出到待写入列表"""
+        while not self._write_q.empty():
+            self._pending_writes.append(self._write_q.get_nowait())
+    
+    async def _flush_loop(self):
+        """后台写入任务：收到记忆后等待一个批次窗口，再一次性批量写入"""
+        while True:
+            self._pending_writes.append(await self._write_q.get())
+            await asyncio.sleep(self.FLUSH_INTERVAL)
+            self._drain_write_queue()
+            batch, self._pending_writes = self._pending_writes, []
+            try:
+                await asyncio.to_thread(self.memory.add_memories_bulk, batch)
+            except Exception as e:
+                logger.error(f"批量保存记忆时出错: {e}", exc_info=True)
+    
+    def _log_cache_usage(self, response):
+        """记录DeepSeek前缀缓存的命中情况"""
+        usage = getattr(response, "usage", None)
+        hit_tokens = getattr(usage, "prompt_cache_hit_tokens", None)
+        if hit_tokens is not None:
+            miss_tokens = getattr(usage, "prompt_cache_miss_tokens", 0)
+            logger.info(f"提示词缓存命中: {hit_tokens} tokens，未命中: {miss_tokens} tokens")
+    
     async def _call_api_with_retry(self, messages, temperature=0.7, max_tokens=2000):
         """带重试机制的API调用"""
         if not self.client:
-            return "抱歉，AI服务暂时不可用。请确保DEEPSEEK_API_KEY环境变量已设置。"
+            return UNAVAILABLE_REPLY
             
         retries = 0
         delay = self.retry_delay
@@ -75,6 +216,7 @@ class CompanionAgent:
                     max_tokens=max_tokens,
                     stream=False
                 )
+                self._log_cache_usage(response)
                 return response.choices[0].message.content
                 
             except asyncio.TimeoutError:
@@ -99,7 +241,65 @@ class CompanionAgent:
                     # 其他错误直接退出重试
                     break
                     
-        return "对不起，我现在遇到了一些网络问题，能稍后再聊吗？"
+        return NETWORK_ERROR_REPLY
+    
+    def _build_messages(self, text: str) -> List[Dict[str, str]]:
+        """构造发送给模型的消息列表"""
+        messages = [
+            {"role": "system", "content": self.system_prompt}
+        ]
+        
+        # 添加历史消息 (限制5条以控制token用量)
+        messages.extend(self.messages[-5:])
+        
+        # 添加用户输入
+        messages.append({"role": "user", "content": text})
+        return messages
+    
+    def _reply_cache_key(self, messages: List[Dict[str, str]]) -> str:
+        """根据请求消息生成回复缓存键"""
+        serialized = json.dumps(messages, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha1(serialized.encode('utf-8')).hexdigest()
+    
+    async def _cache_reply(self, cache_key: str, response: str):
+        """缓存成功生成的回复，兜底回复不缓存（磁盘写入放到线程中，不阻塞事件循环）"""
+        if response and response not in (UNAVAILABLE_REPLY, NETWORK_ERROR_REPLY):
+            await asyncio.to_thread(
+                self.reply_cache.set, cache_key, response, expire=LLM_CACHE['expire']
+            )
+    
+    def _record_turn(self, text: str, response: str):
+        """保存一轮对话到历史、状态和记忆"""
+        # 保存对话历史
+        self.messages.append({"role": "user", "content": text})
+        self.messages.append({"role": "assistant", "content": response})
+        
+        # 清理较旧的消息，避免内存泄漏
+        if len(self.messages) > 100:
+            self.messages = self.messages[-50:]  # 只保留最近50条
+        
+        # 更新状态
+        if self.state_manager:
+            try:
+                self.state_manager.update_last_interaction()
+                self.state_manager.add_to_history("user", text)
+                self.state_manager.add_to_history("assistant", response)
+            except Exception as e:
+                logger.error(f"更新状态时出错: {e}", exc_info=True)
+        
+        # 保存到记忆
+        if self.memory:
+            try:
+                self._enqueue_memory(
+                    "conversation",
+                    text,
+                    {
+                        "response": response,
+                        "timestamp": datetime.now().isoformat()
+                    }
+                )
+            except Exception as e:
+                logger.error(f"保存记忆时出错: {e}", exc_info=True)
     
     async def process_text(self, text: str) -> str:
         """处理文本输入并生成响应"""
@@ -109,54 +309,88 @@ class CompanionAgent:
             if not text or not text.strip():
                 return "嗯？我没听清你说什么，能再说一遍吗？"
             
-            # 准备消息
-            messages = [
-                {"role": "system", "content": self.system_prompt}
-            ]
-            
-            # 添加历史消息 (限制5条以控制token用量)
-            messages.extend(self.messages[-5:])
-            
-            # 添加用户输入
-            messages.append({"role": "user", "content": text})
-            
-            # 调用API
-            response = await self._call_api_with_retry(messages)
-            logger.info(f"生成的响应: {response}")
-            
-            # 保存对话历史
-            self.messages.append({"role": "user", "content": text})
-            self.messages.append({"role": "assistant", "content": response})
-            
-            # 清理较旧的消息，避免内存泄漏
-            if len(self.messages) > 100:
-                self.messages = self.messages[-50:]  # 只保留最近50条
-            
-            # 更新状态
-            if self.state_manager:
-                try:
-                    self.state_manager.update_last_interaction()
-                    self.state_manager.add_to_history("user", text)
-                    self.state_manager.add_to_history("assistant", response)
-                except Exception as e:
-                    logger.error(f"更新状态时出错: {e}", exc_info=True)
-            
-            # 保存到记忆
-            if self.memory:
-                try:
-                    self.memory.add_memory(
-                        memory_type="conversation",
-                        content=text,
-                        metadata={
-                            "response": response,
-                            "timestamp": datetime.now().isoformat()
-                        }
-                    )
-                except Exception as e:
-                    logger.error(f"保存记忆时出错: {e}", exc_info=True)
+            messages = self._build_messages(text)
+            cache_key = self._reply_cache_key(messages)
+            response = await asyncio.to_thread(self.reply_cache.get, cache_key)
+            if response is not None:
+                logger.info(f"命中回复缓存: {response}")
+            else:
+                # 调用API
+                response = await self._call_api_with_retry(messages)
+                logger.info(f"生成的响应: {response}")
+                await self._cache_reply(cache_key, response)
             
+            self._record_turn(text, response)
             return response
             
         except Exception as e:
             logger.error(f"处理文本时出错: {e}", exc_info=True)
-            return "对不起，我现在有点累了，能稍后再聊吗？"
\ No newline at end of file
+            return "对不起，我现在有点累了，能稍后再聊吗？"
+    
+    async def stream_process_text(self, text: str) -> AsyncIterator[str]:
+        """流式处理文本输入，每生成一个完整句子就立即产出"""
+        logger.info(f"收到用户输入: {text}")
+        
+        if not text or not text.strip():
+            yield "嗯？我没听清你说什么，能再说一遍吗？"
+            return
+        
+        messages = self._build_messages(text)
+        cache_key = self._reply_cache_key(messages)
+        cached = await asyncio.to_thread(self.reply_cache.get, cache_key)
+        if cached is not None:
+            logger.info(f"命中回复缓存: {cached}")
+            # 按句子切分后依次产出，保持与流式输出一致的粒度
+            for sentence in split_sentences(cached, final=True)[0]:
+                yield sentence
+            self._record_turn(text, cached)
+            return
+        
+        sentences: List[str] = []
+        
+        if self.client:
+            try:
+                stream = await self.client.chat.completions.create(
+                    model="deepseek-chat",
+                    messages=messages,
+                    temperature=0.7,
+                    max_tokens=2000,
+                    stream=True,
+                    # 让最后一个分块携带用量统计，用于记录前缀缓存命中情况
+                    stream_options={"include_usage": True}
+                )
+                
+                buffer = ""
+                async for chunk in stream:
+                    if getattr(chunk, "usage", None):
+                        self._log_cache_usage(chunk)
+                    if not chunk.choices:
+                        continue
+                    buffer += chunk.choices[0].delta.content or ""
+                    
+                    complete, buffer = split_sentences(buffer)
+                    for sentence in complete:
+                        sentences.append(sentence)
+                        yield sentence
+                
+                for sentence in split_sentences(buffer, final=True)[0]:
+                    sentences.append(sentence)
+                    yield sentence
+                    
+            except Exception as e:
+                logger.error(f"流式API调用错误: {e}", exc_info=True)
+                if sentences:
+                    # 已经输出了部分内容，保留已生成的部分
+                    self._record_turn(text, "".join(sentences))
+                    return
+        
+        if not sentences:
+            # 流式调用不可用或失败时退回到带重试的普通调用
+            response = await self._call_api_with_retry(messages)
+            sentences.append(response)
+            yield response
+        
+        response = "".join(sentences)
+        logger.info(f"生成的响应: {response}")
+        await self._cache_reply(cache_key, response)
+        self._record_turn(text, response)
@@ -125,13 +125,20 @@ def create_state_tools(state_manager) -> List[Tool]:
             print(f"更新话题错误: {e}")
             return "更新话题时发生错误"
 
+    # 用户信息只在 user_state 被替换时变化，按版本号缓存结果
+    user_info_cache = {'version': -1, 'result': None}
+
     async def async_get_user_info() -> str:
         """异步获取用户信息"""
         try:
-            user_info = await state_manager.get_user_info()
+            if user_info_cache['version'] == state_manager.user_version:
+                return user_info_cache['result']
+            user_info = state_manager.get_user_info()
             if not user_info:
                 return "没有获取到用户信息"
-            return str(user_info)
+            user_info_cache['result'] = str(user_info)
+            user_info_cache['version'] = state_manager.user_version
+            return user_info_cache['result']
         except Exception as e:
             print(f"获取用户信息错误: {e}")
             return "获取用户信息时发生错误"
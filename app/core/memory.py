@@ -2,9 +2,9 @@
 import sqlite3
 from datetime import datetime
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 from config.settings import DATABASE
-import json
+import orjson
 import logging
 
 logger = logging.getLogger(__name__)
@@ -12,9 +12,9 @@ logger = logging.getLogger(__name__)
 class Memory:
     def __init__(self):
         self.db_path = DATABASE['path']
-        self._init_db()
-        # 确保数据目录存在
+        # 确保数据目录存在（需要在连接数据库之前）
         self.db_path.parent.mkdir(exist_ok=True)
+        self._init_db()
     
     def _init_db(self):
         """初始化数据库"""
@@ -56,7 +56,7 @@ class Memory:
                 cursor = conn.cursor()
                 
                 timestamp = datetime.now().isoformat()
-                metadata_str = json.dumps(metadata) if metadata else None
+                metadata_str = orjson.dumps(metadata).decode() if metadata else None
                 
                 cursor.execute(
                     'INSERT INTO memories (timestamp, type, content, metadata) VALUES (?, ?, ?, ?)',
@@ -69,6 +69,32 @@ class Memory:
             logger.error(f"添加记忆失败: {e}", exc_info=True)
             return None
     
+    def add_memories_bulk(self, items: List[Tuple[str, str, Optional[Dict[str, Any]]]]) -> int:
+        """批量添加记忆，items 为 (类型, 内容, 元数据) 元组列表，一次事务提交"""
+        if not items:
+            return 0
+        try:
+            timestamp = datetime.now().isoformat()
+            rows = [
+                (
+                    (metadata or {}).get('timestamp', timestamp),
+                    memory_type,
+                    content,
+                    orjson.dumps(metadata).decode() if metadata else None
+                )
+                for memory_type, content, metadata in items
+            ]
+            with self._get_connection() as conn:
+                conn.executemany(
+                    'INSERT INTO memories (timestamp, type, content, metadata) VALUES (?, ?, ?, ?)',
+                    rows
+                )
+                conn.commit()
+            return len(rows)
+        except Exception as e:
+            logger.error(f"批量添加记忆失败: {e}", exc_info=True)
+            return 0
+    
     def get_recent_memories(self, limit: int = 10) -> List[Dict[str, Any]]:
         """获取最近的记忆"""
         try:
@@ -87,7 +113,7 @@ class Memory:
                         'timestamp': row[1],
                         'type': row[2],
                         'content': row[3],
-                        'metadata': json.loads(row[4]) if row[4] else None
+                        'metadata': orjson.loads(row[4]) if row[4] else None
                     })
                 
                 return memories
@@ -120,7 +146,7 @@ class Memory:
                         'timestamp': row[1],
                         'type': row[2],
                         'content': row[3],
-                        'metadata': json.loads(row[4]) if row[4] else None
+                        'metadata': orjson.loads(row[4]) if row[4] else None
                     })
                 
                 return memories
@@ -8,6 +8,7 @@ import hmac
 import asyncio
 import websockets
 import edge_tts
+import diskcache
 import numpy as np
 import soundfile as sf
 import io
@@ -17,9 +18,10 @@ from urllib.parse import urlencode
 from wsgiref.handlers import format_date_time
 from time import mktime
 import logging
-from typing import Optional, Tuple, Dict, Any
+from typing import Optional, Tuple, Dict, Any, Union
 import tempfile
 import ssl
+from config.settings import SPEECH
 
 # 配置日志
 logger = logging.getLogger(__name__)
@@ -44,6 +46,15 @@ class SpeechProcessor:
         self.voice = os.getenv('EDGE_TTS_VOICE', 'zh-CN-XiaoxiaoNeural')
         logger.info(f"使用语音模型: {self.voice}")
         
+        # 限制同时在线程池中进行的音频预处理数量（CPU密集），首次使用时创建
+        self._process_sem: Optional[asyncio.Semaphore] = None
+        
+        # 语音合成结果的磁盘缓存（按最近最少使用淘汰）
+        self.tts_cache = diskcache.Cache(
+            str(SPEECH['tts_cache_dir']),
+            size_limit=SPEECH['tts_cache_size']
+        )
+        
         # 讯飞 API 配置
         self.APPID = os.getenv("XUNFEI_APPID")
         self.APIKey = os.getenv("XUNFEI_APIKEY")
@@ -247,6 +258,14 @@ class SpeechProcessor:
             raise ValueError("请提供要转换的文本")
         
         logger.info(f"开始文本转语音，文本: {text}")
+        
+        # 相同声音和文本的合成结果直接从缓存读取（磁盘缓存读写放到线程中，不阻塞事件循环）
+        cache_key = hashlib.sha1(f"{self.voice}\n{text}".encode('utf-8')).hexdigest()
+        cached = await asyncio.to_thread(self.tts_cache.get, cache_key)
+        if cached is not None:
+            logger.info("命中语音合成缓存")
+            return cached
+        
         temp_path = None
         
         try:
@@ -269,6 +288,7 @@ class SpeechProcessor:
                     audio_data = f.read()
                 logger.debug(f"读取的音频数据长度: {len(audio_data)} 字节")
                 
+                await asyncio.to_thread(self.tts_cache.set, cache_key, audio_data)
                 return audio_data
                 
             except Exception as e:
@@ -285,13 +305,17 @@ class SpeechProcessor:
             logger.error(f"文本转语音错误: {e}", exc_info=True)
             raise
     
-    def _process_audio(self, audio_data: bytes) -> Tuple[np.ndarray, float]:
+    def _process_audio(self, audio_data: Union[bytes, np.ndarray]) -> Tuple[np.ndarray, float]:
         """处理音频数据，确保正确的格式和采样率"""
         try:
-            logger.info(f"开始处理音频数据，长度: {len(audio_data)} 字节")
-            
+            # 已解析的PCM采样视图直接使用，避免再次拷贝
+            if isinstance(audio_data, np.ndarray):
+                logger.info(f"开始处理音频数据，长度: {audio_data.nbytes} 字节")
+                data = audio_data
+                sample_rate = self.SAMPLE_RATE
             # 检查数据是否为WAV格式
-            if audio_data.startswith(b'RIFF') and b'WAVE' in audio_data[:12]:
+            elif audio_data.startswith(b'RIFF') and b'WAVE' in audio_data[:12]:
+                logger.info(f"开始处理音频数据，长度: {len(audio_data)} 字节")
                 logger.info("检测到WAV格式音频")
                 with io.BytesIO(audio_data) as audio_io:
                     try:
@@ -301,6 +325,7 @@ class SpeechProcessor:
                         logger.error(f"WAV文件读取失败: {e}")
                         raise ValueError("无效的WAV文件格式")
             else:
+                logger.info(f"开始处理音频数据，长度: {len(audio_data)} 字节")
                 logger.info("尝试解析为PCM格式")
                 # 确保数据长度是偶数（16位采样要求）
                 if len(audio_data) % 2 != 0:
@@ -329,8 +354,8 @@ class SpeechProcessor:
                 logger.error("音频数据包含无效值")
                 raise ValueError("无效的音频数据：包含NaN或Inf")
             
-            # 转换为float32进行处理
-            data = data.astype(np.float32) / 32768.0
+            # 转换为float32进行处理（类型转换与缩放在一次遍历中完成，不产生中间数组）
+            data = np.multiply(data, np.float32(1.0 / 32768.0), dtype=np.float32)
             logger.debug(f"将数据转换为float32，范围: [{np.min(data)}, {np.max(data)}]")
             
             # 重采样到目标采样率
@@ -382,19 +407,26 @@ class SpeechProcessor:
             logger.error(f"音频处理错误: {e}", exc_info=True)
             raise
 
-    async def speech_to_text(self, audio_data: bytes) -> str:
-        """使用讯飞 API 进行语音识别"""
+    async def speech_to_text(self, audio_data: Union[bytes, np.ndarray]) -> str:
+        """使用讯飞 API 进行语音识别
+
+        audio_data 可以是原始音频字节，也可以是已解析的16位PCM采样数组
+        """
         try:
             # 验证音频数据
-            if not audio_data:
+            if audio_data is None or len(audio_data) == 0:
                 logger.error("音频数据为空")
                 return "请提供音频数据"
             
-            logger.info(f"开始处理音频数据，长度: {len(audio_data)} 字节")
+            audio_bytes = audio_data.nbytes if isinstance(audio_data, np.ndarray) else len(audio_data)
+            logger.info(f"开始处理音频数据，长度: {audio_bytes} 字节")
             
             # 处理音频数据
             try:
-                audio_np, audio_length = await asyncio.to_thread(self._process_audio, audio_data)
+                if self._process_sem is None:
+                    self._process_sem = asyncio.Semaphore(os.cpu_count() or 4)
+                async with self._process_sem:
+                    audio_np, audio_length = await asyncio.to_thread(self._process_audio, audio_data)
                 logger.info(f"音频处理完成，时长: {audio_length:.2f} 秒")
             except ValueError as e:
                 logger.error(f"音频处理错误: {e}", exc_info=True)
@@ -4,9 +4,9 @@ from typing import Dict, Any, Optional
 from datetime import datetime
 import json
 
-@dataclass
+@dataclass(frozen=True)
 class UserState:
-    """用户状态"""
+    """用户状态（不可变，修改需整体替换 StateManager.user_state 以更新版本号）"""
     name: str
     age: int
     gender: str
@@ -29,9 +29,25 @@ class ConversationState:
 
 class StateManager:
     def __init__(self, user_config: Dict[str, Any]):
+        # 用户信息版本号，每次替换 user_state 时递增，供调用方判断缓存是否失效
+        self.user_version = 0
         self.user_state = UserState(**user_config['profile'])
         self.conversation_state = ConversationState()
     
+    @property
+    def user_state(self) -> UserState:
+        """用户状态"""
+        return self._user_state
+    
+    @user_state.setter
+    def user_state(self, state: UserState):
+        self._user_state = state
+        self.user_version += 1
+    
+    def get_user_info(self) -> Dict[str, Any]:
+        """获取用户信息"""
+        return asdict(self.user_state)
+    
     def update_last_interaction(self):
         """更新最后交互时间"""
         self.conversation_state.last_interaction = datetime.now()
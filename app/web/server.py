@@ -17,11 +17,15 @@ from app.core.memory import Memory
 from app.core.state import StateManager
 from app.agent.companion_agent import CompanionAgent
 import base64
+import numpy as np
 from fastapi import WebSocketDisconnect
 from fastapi.websockets import WebSocketState
-from typing import Dict, List, Any, Optional, Set
+from typing import Dict, List, Any, Optional, Set, Tuple
 import time
 import os
+import heapq
+import hashlib
+import itertools
 from datetime import datetime
 
 # 配置日志
@@ -44,6 +48,12 @@ class ConnectionManager:
     def __init__(self):
         self.active_connections: Set[WebSocket] = set()
         self.connection_info: Dict[WebSocket, Dict[str, Any]] = {}
+        # 按最后活动时间排序的最小堆，过期条目在清理时惰性丢弃
+        self._activity_heap: List[Tuple[float, int, WebSocket]] = []
+        self._heap_seq = itertools.count()
+    
+    def _push_activity(self, websocket: WebSocket, last_activity: float):
+        heapq.heappush(self._activity_heap, (last_activity, next(self._heap_seq), websocket))
     
     async def connect(self, websocket: WebSocket, client_id: str = None):
         await websocket.accept()
@@ -53,6 +63,7 @@ class ConnectionManager:
             "connected_at": datetime.now().isoformat(),
             "last_activity": time.time()
         }
+        self._push_activity(websocket, self.connection_info[websocket]["last_activity"])
         logger.info(f"客户端连接: {self.connection_info[websocket]['client_id']}")
     
     def disconnect(self, websocket: WebSocket):
@@ -65,31 +76,62 @@ class ConnectionManager:
     
     def update_activity(self, websocket: WebSocket):
         if websocket in self.connection_info:
-            self.connection_info[websocket]["last_activity"] = time.time()
+            now = time.time()
+            self.connection_info[websocket]["last_activity"] = now
+            self._push_activity(websocket, now)
     
-    async def broadcast(self, message: str):
-        """向所有客户端广播消息"""
-        for connection in self.active_connections:
+    async def broadcast(self, payload: bytes):
+        """向所有客户端广播消息
+
+        payload 为已编码的UTF-8 JSON字节，以二进制帧发送，所有客户端共用同一份数据，
+        不再为每个连接重复编码。
+        """
+        # 遍历快照，发送失败的连接在循环结束后统一断开，避免遍历时修改集合
+        dead = []
+        for connection in list(self.active_connections):
             try:
-                await connection.send_text(message)
+                await connection.send_bytes(payload)
             except Exception as e:
                 logger.error(f"发送广播消息失败: {e}")
-                self.disconnect(connection)
+                dead.append(connection)
+        
+        for connection in dead:
+            self.disconnect(connection)
     
     async def cleanup_inactive_connections(self, timeout: int = 120):
         """清理不活跃的连接"""
-        now = time.time()
-        for ws in list(self.active_connections):
-            last_activity = self.connection_info.get(ws, {}).get("last_activity", 0)
-            if now - last_activity > timeout:
-                logger.info(f"关闭不活跃连接: {self.connection_info.get(ws, {}).get('client_id', 'unknown')}")
-                try:
-                    await ws.close(code=1000, reason="不活跃超时")
-                except:
-                    pass
-                self.disconnect(ws)
+        cutoff = time.time() - timeout
+        while self._activity_heap and self._activity_heap[0][0] < cutoff:
+            last_activity, _, ws = heapq.heappop(self._activity_heap)
+            info = self.connection_info.get(ws)
+            # 连接已断开或之后有过活动，该条目已过期
+            if info is None or info["last_activity"] != last_activity:
+                continue
+            
+            logger.info(f"关闭不活跃连接: {info.get('client_id', 'unknown')}")
+            try:
+                await ws.close(code=1000, reason="不活跃超时")
+            except:
+                pass
+            self.disconnect(ws)
+
+def _error_payload(content: str) -> str:
+    """预先序列化错误消息（与send_json的编码方式一致）"""
+    return json.dumps({"type": "error", "content": content}, separators=(",", ":"), ensure_ascii=False)
 
 class WebServer:
+    # 固定内容的错误消息只序列化一次
+    ERR_TTS_TIMEOUT = _error_payload("语音合成超时，请重试")
+    ERR_TTS_FAILED = _error_payload("语音合成失败，请重试")
+    ERR_AUDIO_EMPTY = _error_payload("收到空的音频数据")
+    ERR_ASR_EMPTY = _error_payload("未能识别语音内容，请重试")
+    ERR_RESPONSE_EMPTY = _error_payload("生成响应失败")
+    ERR_ASR_FAILED = _error_payload("语音识别出错，请重试")
+    ERR_TEXT_EMPTY = _error_payload("消息内容不能为空")
+    ERR_INVALID_MESSAGE = _error_payload("无效的消息格式")
+    ERR_INVALID_JSON = _error_payload("无效的JSON格式")
+    ERR_SERVER = _error_payload("服务器处理请求时出错")
+    
     def __init__(self):
         self.app = FastAPI(
             title="AI Toy API",
@@ -133,6 +175,44 @@ class WebServer:
                 content={"detail": "服务器内部错误", "message": str(exc)}
             )
     
+    async def stream_reply(self, websocket: WebSocket, text: str) -> str:
+        """流式生成回复：模型逐句产出文本，语音合成与发送在另一个任务中并行进行"""
+        queue: asyncio.Queue = asyncio.Queue()
+        sentences: List[str] = []
+        
+        async def produce():
+            try:
+                async for sentence in self.agent.stream_process_text(text):
+                    sentences.append(sentence)
+                    await websocket.send_json({
+                        "type": "text_delta",
+                        "content": sentence
+                    })
+                    await queue.put(sentence)
+            finally:
+                await queue.put(None)
+        
+        async def consume():
+            while (sentence := await queue.get()) is not None:
+                try:
+                    audio_response = await self.speech_processor.text_to_speech(sentence)
+                except asyncio.TimeoutError:
+                    logger.error("语音合成超时")
+                    await websocket.send_text(self.ERR_TTS_TIMEOUT)
+                    continue
+                except Exception as e:
+                    logger.error(f"语音合成错误: {e}", exc_info=True)
+                    await websocket.send_text(self.ERR_TTS_FAILED)
+                    continue
+                
+                await websocket.send_json({
+                    "type": "audio",
+                    "content": base64.b64encode(audio_response).decode('utf-8')
+                })
+        
+        await asyncio.gather(produce(), consume())
+        return "".join(sentences)
+    
     async def send_heartbeat(self, websocket: WebSocket):
         """发送心跳包"""
         try:
@@ -180,14 +260,24 @@ class WebServer:
             
         self.app.mount("/static", StaticFiles(directory=str(static_dir)), name="static")
         
+        # 首页只在启动时读取一次
+        try:
+            self._index_bytes = (static_dir / "index.html").read_bytes()
+            self._index_etag = f'"{hashlib.sha1(self._index_bytes).hexdigest()}"'
+        except Exception as e:
+            logger.error(f"读取index.html失败: {e}")
+            self._index_bytes = None
+            self._index_etag = None
+        
         @self.app.get("/")
-        async def root():
-            try:
-                html_content = (static_dir / "index.html").read_text(encoding='utf-8')
-                return HTMLResponse(content=html_content, media_type="text/html")
-            except Exception as e:
-                logger.error(f"读取index.html失败: {e}")
+        async def root(request: Request):
+            if self._index_bytes is None:
                 return HTMLResponse(content="服务器错误", status_code=500)
+            
+            headers = {"ETag": self._index_etag}
+            if request.headers.get("if-none-match") == self._index_etag:
+                return Response(status_code=304, headers=headers)
+            return HTMLResponse(content=self._index_bytes, media_type="text/html", headers=headers)
         
         @self.app.get("/health")
         async def health_check():
@@ -216,103 +306,58 @@ class WebServer:
                         # 处理二进制音频数据
                         if "bytes" in data:
                             audio_data = data["bytes"]
-                            audio_size = len(audio_data)
-                            logger.info(f"收到音频数据大小: {audio_size} bytes")
+                            # 一次性零拷贝转换为16位PCM采样视图，后续处理直接复用
+                            samples = np.frombuffer(audio_data, dtype=np.int16, count=len(audio_data) // 2)
+                            logger.info(f"收到音频数据大小: {samples.nbytes} bytes")
                             
                             # 检查音频数据大小
-                            if audio_size > self.MAX_AUDIO_SIZE:
-                                logger.error(f"音频数据太大: {audio_size} bytes")
+                            if samples.nbytes > self.MAX_AUDIO_SIZE:
+                                logger.error(f"音频数据太大: {samples.nbytes} bytes")
                                 await websocket.send_json({
                                     "type": "error",
-                                    "content": f"音频数据太大（{audio_size} bytes），最大允许 {self.MAX_AUDIO_SIZE} bytes"
+                                    "content": f"音频数据太大（{samples.nbytes} bytes），最大允许 {self.MAX_AUDIO_SIZE} bytes"
                                 })
                                 continue
                             
-                            if audio_size == 0:
+                            if samples.size == 0:
                                 logger.error("收到空的音频数据")
+                                await websocket.send_text(self.ERR_AUDIO_EMPTY)
+                                continue
+                            
+                            # 超长的PCM音频直接拒绝，不做截断
+                            is_wav = audio_data.startswith(b'RIFF')
+                            max_samples = self.speech_processor.MAX_AUDIO_LENGTH * self.speech_processor.SAMPLE_RATE
+                            if not is_wav and samples.size > max_samples:
+                                logger.warning(f"音频超过长度限制: {samples.size} 个采样点")
                                 await websocket.send_json({
                                     "type": "error",
-                                    "content": "收到空的音频数据"
+                                    "content": f"请将音频控制在 {self.speech_processor.MAX_AUDIO_LENGTH} 秒以内"
                                 })
                                 continue
                             
                             try:
-                                # 语音转文字
-                                text = await self.speech_processor.speech_to_text(audio_data)
+                                # 语音转文字（WAV需要解析文件头，PCM直接传入零拷贝的采样视图）
+                                text = await self.speech_processor.speech_to_text(audio_data if is_wav else samples)
                                 if not text:
                                     logger.error("语音识别结果为空")
-                                    await websocket.send_json({
-                                        "type": "error",
-                                        "content": "未能识别语音内容，请重试"
-                                    })
+                                    await websocket.send_text(self.ERR_ASR_EMPTY)
                                     continue
                                 
                                 logger.info(f"语音识别结果: {text}")
                                 
-                                # 生成响应
-                                response = await self.agent.process_text(text)
+                                # 生成响应，逐句合成语音并发送
+                                response = await self.stream_reply(websocket, text)
                                 if not response:
                                     logger.error("生成响应为空")
-                                    await websocket.send_json({
-                                        "type": "error",
-                                        "content": "生成响应失败"
-                                    })
+                                    await websocket.send_text(self.ERR_RESPONSE_EMPTY)
                                     continue
                                 
                                 logger.info(f"生成的响应: {response}")
                                 
-                                # 生成语音
-                                try:
-                                    audio_response = await self.speech_processor.text_to_speech(response)
-                                except asyncio.TimeoutError:
-                                    logger.error("语音合成超时")
-                                    await websocket.send_json({
-                                        "type": "error",
-                                        "content": "语音合成超时，请重试"
-                                    })
-                                    continue
-                                except Exception as e:
-                                    logger.error(f"语音合成错误: {e}", exc_info=True)
-                                    await websocket.send_json({
-                                        "type": "error",
-                                        "content": "语音合成失败，请重试"
-                                    })
-                                    continue
-                                
-                                # 将音频数据转换为base64
-                                try:
-                                    audio_response_base64 = base64.b64encode(audio_response).decode('utf-8')
-                                    logger.debug(f"转换后的base64数据长度: {len(audio_response_base64)}")
-                                except Exception as e:
-                                    logger.error(f"Base64编码错误: {e}", exc_info=True)
-                                    await websocket.send_json({
-                                        "type": "error",
-                                        "content": "音频响应处理错误"
-                                    })
-                                    continue
-                                
-                                # 发送响应
-                                try:
-                                    logger.info("开始发送响应")
-                                    await websocket.send_json({
-                                        "type": "text",
-                                        "content": response
-                                    })
-                                    await websocket.send_json({
-                                        "type": "audio",
-                                        "content": audio_response_base64
-                                    })
-                                    logger.info("响应发送完成")
-                                except Exception as e:
-                                    logger.error(f"发送响应错误: {e}", exc_info=True)
-                                
                             except Exception as e:
                                 error_msg = f"处理音频时出错: {str(e)}\n{traceback.format_exc()}"
                                 logger.error(error_msg)
-                                await websocket.send_json({
-                                    "type": "error",
-                                    "content": "语音识别出错，请重试"
-                                })
+                                await websocket.send_text(self.ERR_ASR_FAILED)
                         
                         # 处理文本消息
                         elif "text" in data:
@@ -327,10 +372,7 @@ class WebServer:
                             # 处理文本消息
                             if text_content := json_data.get("content"):
                                 if not text_content.strip():
-                                    await websocket.send_json({
-                                        "type": "error",
-                                        "content": "消息内容不能为空"
-                                    })
+                                    await websocket.send_text(self.ERR_TEXT_EMPTY)
                                     continue
                                 
                                 # 生成响应
@@ -355,27 +397,18 @@ class WebServer:
                                         "content": audio_response_base64
                                     })
                             else:
-                                await websocket.send_json({
-                                    "type": "error",
-                                    "content": "无效的消息格式"
-                                })
+                                await websocket.send_text(self.ERR_INVALID_MESSAGE)
                     
                     except WebSocketDisconnect:
                         logger.info("WebSocket连接断开")
                         break
                     except json.JSONDecodeError:
                         logger.error("JSON解析错误")
-                        await websocket.send_json({
-                            "type": "error",
-                            "content": "无效的JSON格式"
-                        })
+                        await websocket.send_text(self.ERR_INVALID_JSON)
                     except Exception as e:
                         logger.error(f"处理WebSocket消息错误: {e}", exc_info=True)
                         try:
-                            await websocket.send_json({
-                                "type": "error",
-                                "content": "服务器处理请求时出错"
-                            })
+                            await websocket.send_text(self.ERR_SERVER)
                         except:
                             # 如果连接已断开，忽略错误
                             break
@@ -454,6 +487,8 @@ class WebServer:
                 app=self.app,
                 host=host,
                 port=port,
+                http="httptools",
+                ws="websockets",
                 ssl_certfile=str(ssl_config['cert_file']) if ssl_context else None,
                 ssl_keyfile=str(ssl_config['key_file']) if ssl_context else None,
                 log_level="info"
@@ -473,3 +508,5 @@ class WebServer:
             # 取消所有后台任务
             for task in self.background_tasks:
                 task.cancel()
+            # 写出未落盘的对话记忆并关闭API连接
+            await self.agent.aclose()
@@ -2,6 +2,9 @@ let mediaRecorder;
 let audioChunks = [];
 let isRecording = false;
 let socket;
+let currentAiMessage = null;  // 流式回复正在追加的消息
+let audioQueue = [];          // 待播放的音频片段
+let isPlaying = false;
 
 const startButton = document.getElementById('startButton');
 const stopButton = document.getElementById('stopButton');
@@ -40,7 +43,9 @@ function initWebSocket() {
     };
     
     socket.onmessage = async (event) => {
-        const response = JSON.parse(event.data);
+        // 广播消息以二进制帧发送，内容同样是UTF-8编码的JSON
+        const raw = typeof event.data === 'string' ? event.data : await event.data.text();
+        const response = JSON.parse(raw);
         
         if (response.type === 'error') {
             showError(response.content);
@@ -49,44 +54,24 @@ function initWebSocket() {
         
         if (response.type === 'text') {
             // 显示文本响应
+            currentAiMessage = null;
             addMessage(response.content, 'ai');
         }
         
+        if (response.type === 'text_delta') {
+            // 流式文本片段追加到同一条消息
+            if (!currentAiMessage) {
+                currentAiMessage = addMessage('', 'ai');
+            }
+            currentAiMessage.textContent += response.content;
+            chatBox.scrollTop = chatBox.scrollHeight;
+        }
+        
         if (response.type === 'audio') {
-            try {
-                // 播放音频响应
-                const audioData = base64ToBlob(response.content, 'audio/mp3');
-                const audioUrl = URL.createObjectURL(audioData);
-                const audio = new Audio(audioUrl);
-                
-                // 设置音频参数
-                audio.volume = 1.0;  // 最大音量
-                
-                // 添加事件监听
-                audio.addEventListener('playing', () => {
-                    console.log('开始播放音频');
-                    status.textContent = '正在播放回复...';
-                });
-                
-                audio.addEventListener('ended', () => {
-                    console.log('音频播放完成');
-                    status.textContent = '准备就绪';
-                    URL.revokeObjectURL(audioUrl);
-                });
-                
-                audio.addEventListener('error', (e) => {
-                    console.error('音频播放错误:', e);
-                    status.textContent = '音频播放失败';
-                    showError('音频播放失败，请重试');
-                    URL.revokeObjectURL(audioUrl);
-                });
-                
-                // 播放音频
-                await audio.play();
-            } catch (error) {
-                console.error('音频播放错误:', error);
-                showError('音频播放失败：' + error.message);
-                status.textContent = '音频播放失败';
+            // 音频片段按顺序排队播放
+            audioQueue.push(response.content);
+            if (!isPlaying) {
+                playNextAudio();
             }
         }
     };
@@ -104,6 +89,64 @@ function initWebSocket() {
     };
 }
 
+// 依次播放队列中的音频
+async function playNextAudio() {
+    const content = audioQueue.shift();
+    if (content === undefined) {
+        isPlaying = false;
+        status.textContent = '准备就绪';
+        return;
+    }
+    isPlaying = true;
+    
+    // 确保每个片段只触发一次播放下一段
+    let advanced = false;
+    const next = () => {
+        if (!advanced) {
+            advanced = true;
+            playNextAudio();
+        }
+    };
+    
+    try {
+        // 播放音频响应
+        const audioData = base64ToBlob(content, 'audio/mp3');
+        const audioUrl = URL.createObjectURL(audioData);
+        const audio = new Audio(audioUrl);
+        
+        // 设置音频参数
+        audio.volume = 1.0;  // 最大音量
+        
+        // 添加事件监听
+        audio.addEventListener('playing', () => {
+            console.log('开始播放音频');
+            status.textContent = '正在播放回复...';
+        });
+        
+        audio.addEventListener('ended', () => {
+            console.log('音频播放完成');
+            URL.revokeObjectURL(audioUrl);
+            next();
+        });
+        
+        audio.addEventListener('error', (e) => {
+            console.error('音频播放错误:', e);
+            status.textContent = '音频播放失败';
+            showError('音频播放失败，请重试');
+            URL.revokeObjectURL(audioUrl);
+            next();
+        });
+        
+        // 播放音频
+        await audio.play();
+    } catch (error) {
+        console.error('音频播放错误:', error);
+        showError('音频播放失败：' + error.message);
+        status.textContent = '音频播放失败';
+        next();
+    }
+}
+
 // 请求麦克风权限
 async function requestMicrophonePermission() {
     try {
@@ -150,6 +193,7 @@ async function startRecording() {
         };
         
         mediaRecorder.onstop = async () => {
+            currentAiMessage = null;
             const audioBlob = new Blob(audioChunks, { type: 'audio/webm' });
             socket.send(audioBlob);
             audioChunks = [];
@@ -194,6 +238,7 @@ function addMessage(content, type) {
     messageDiv.textContent = content;
     chatBox.appendChild(messageDiv);
     chatBox.scrollTop = chatBox.scrollHeight;
+    return messageDiv;
 }
 
 // 显示错误信息
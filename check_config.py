@@ -13,6 +13,7 @@ import dotenv
 import sqlite3
 import asyncio
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 
 # 设置日志
 logging.basicConfig(
@@ -38,11 +39,11 @@ def check_dependencies():
         "fastapi", "uvicorn", "openai", "edge_tts", "numpy", 
         "soundfile", "pydantic", "langchain"
     ]
-    missing_packages = []
     
-    for package in required_packages:
-        if importlib.util.find_spec(package) is None:
-            missing_packages.append(package)
+    # 并行查找各个包，find_spec 主要耗时在文件系统访问上
+    with ThreadPoolExecutor(max_workers=len(required_packages)) as executor:
+        specs = list(executor.map(importlib.util.find_spec, required_packages))
+    missing_packages = [package for package, spec in zip(required_packages, specs) if spec is None]
     
     if missing_packages:
         logger.error(f"缺少以下依赖: {', '.join(missing_packages)}")
@@ -132,7 +133,8 @@ async def check_network():
     
     import aiohttp
     try:
-        async with aiohttp.ClientSession() as session:
+        connector = aiohttp.TCPConnector(limit=1)
+        async with aiohttp.ClientSession(connector=connector) as session:
             # 测试DeepSeek API连接
             async with session.get('https://api.deepseek.com/healthz', timeout=5) as resp:
                 if resp.status == 200:
@@ -145,6 +147,14 @@ async def check_network():
         logger.error(f"网络测试失败: {e}")
         return False
 
+async def check_network_bounded(timeout: float = 5.0):
+    """在限定时间内检查网络；超时只给出警告（返回None），不计为检查失败"""
+    try:
+        return await asyncio.wait_for(check_network(), timeout=timeout)
+    except asyncio.TimeoutError:
+        logger.warning(f"网络检查超过{timeout}秒未完成，跳过")
+        return None
+
 def run_system_check():
     """运行系统检查"""
     try:
@@ -195,32 +205,36 @@ async def main():
     print("       AI Toy 配置检查工具")
     print("=" * 50)
     
-    # 系统级检查
-    all_passed = check_python_version()
-    
-    # 环境检查
-    all_passed = check_dependencies() and all_passed
-    all_passed = check_directories() and all_passed
-    all_passed = check_environment_variables() and all_passed
-    all_passed = check_ssl_certificates() and all_passed
-    
-    # 数据库检查
-    try:
-        all_passed = check_database() and all_passed
-    except Exception as e:
-        logger.error(f"数据库检查失败: {e}")
-        all_passed = False
-    
-    # 系统设备检查
-    all_passed = run_system_check() and all_passed
+    loop = asyncio.get_running_loop()
     
-    # 网络检查
+    # 数据库检查会创建data目录，目录结构必须先于其他检查完成，结果才稳定
     try:
-        network_check = await check_network()
-        all_passed = network_check and all_passed
+        dirs_ok = await loop.run_in_executor(None, check_directories)
     except Exception as e:
-        logger.error(f"网络检查失败: {e}")
-        all_passed = False
+        logger.error(f"目录结构检查失败: {e}")
+        dirs_ok = False
+    
+    # 其余检查互不依赖，并发执行（使用run_in_executor以兼容Python 3.8）
+    checks = {
+        "Python版本": loop.run_in_executor(None, check_python_version),
+        "依赖项": loop.run_in_executor(None, check_dependencies),
+        "环境变量": loop.run_in_executor(None, check_environment_variables),
+        "SSL证书": loop.run_in_executor(None, check_ssl_certificates),
+        "数据库": loop.run_in_executor(None, check_database),
+        "音频设备": loop.run_in_executor(None, run_system_check),
+        "网络": check_network_bounded(),
+    }
+    results = await asyncio.gather(*checks.values(), return_exceptions=True)
+    
+    all_passed = dirs_ok
+    for name, result in zip(checks, results):
+        if isinstance(result, Exception):
+            logger.error(f"{name}检查失败: {result}")
+            result = False
+        if result is None:
+            # 未得出结论的检查（如网络超时）只提示，不影响总体结果
+            continue
+        all_passed = result and all_passed
     
     print("\n" + "=" * 50)
     if all_passed:
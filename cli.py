@@ -4,8 +4,7 @@ import edge_tts
 import sounddevice as sd
 import numpy as np
 import soundfile as sf
-import tempfile
-import os
+import io
 import signal
 from app.core.speech import SpeechProcessor
 from app.agent.companion_agent import CompanionAgent
@@ -15,6 +14,7 @@ from config.settings import USER_CONFIG
 import logging
 import sys
 import time
+import threading
 
 # 配置日志
 logging.basicConfig(
@@ -27,6 +27,30 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+async def ainput(prompt: str = "") -> str:
+    """不阻塞事件循环的 input()
+
+    在守护线程中读取标准输入，等待期间后台任务（预热、流式播放等）可以继续运行，
+    退出程序时也不会因为线程阻塞在读取上而卡住。
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+    
+    def resolve(setter, value):
+        if not future.done():
+            setter(value)
+    
+    def read():
+        try:
+            line = input(prompt)
+        except BaseException as e:
+            loop.call_soon_threadsafe(resolve, future.set_exception, e)
+        else:
+            loop.call_soon_threadsafe(resolve, future.set_result, line)
+    
+    threading.Thread(target=read, daemon=True).start()
+    return await future
+
 class CommandLineClient:
     def __init__(self):
         """初始化命令行客户端"""
@@ -46,8 +70,17 @@ class CommandLineClient:
             self.channels = 1
             self.dtype = np.int16
             
-            # 临时文件列表，用于清理
-            self.temp_files = []
+            # 语音端点检测配置
+            self.VAD_BLOCK_SIZE = 3200  # 每次回调200毫秒
+            self.VAD_THRESHOLD = 500  # 判定为说话的RMS能量阈值
+            self.VAD_SILENCE_SAMPLES = int(0.8 * self.sample_rate)  # 说话后静音0.8秒即结束
+            
+            # 预分配录音缓冲区，每次录音复用
+            self.MAX_RECORD_SECONDS = 30
+            self._rec_buf = np.empty((self.MAX_RECORD_SECONDS * self.sample_rate, self.channels), dtype=self.dtype)
+            
+            # 流式回复时最多缓冲的句子/音频数量
+            self.PIPELINE_DEPTH = 3
             
             # 设置信号处理
             signal.signal(signal.SIGINT, self._signal_handler)
@@ -60,41 +93,76 @@ class CommandLineClient:
     
     def _signal_handler(self, sig, frame):
         """处理Ctrl+C信号"""
-        print("\n正在清理资源并退出...")
-        self._cleanup()
+        print("\n正在退出...")
         sys.exit(0)
     
-    def _cleanup(self):
-        """清理临时文件"""
-        for temp_file in self.temp_files:
-            if os.path.exists(temp_file):
-                try:
-                    os.unlink(temp_file)
-                except Exception as e:
-                    logger.error(f"删除临时文件错误: {e}")
-    
     async def record_audio(self, duration=5):
-        """录制音频"""
-        print(f"\n开始录音（{duration}秒）...")
+        """录制音频
+
+        以流的方式采集麦克风数据，检测到说话后如果持续静音超过阈值就提前结束，
+        最长录制 duration 秒。
+        """
+        print(f"\n开始录音（最长{duration}秒，说完停顿一下即可结束）...")
         
         try:
-            # 录制音频
-            audio_data = sd.rec(
-                int(duration * self.sample_rate),
+            loop = asyncio.get_running_loop()
+            blocks: asyncio.Queue = asyncio.Queue()
+            
+            # 常规时长复用预分配的缓冲区，超长录音才临时分配
+            total = int(duration * self.sample_rate)
+            if total <= len(self._rec_buf):
+                buf = self._rec_buf
+            else:
+                buf = np.empty((total, self.channels), dtype=self.dtype)
+            written = 0
+            
+            def callback(indata, frames, time_info, status):
+                nonlocal written
+                if status:
+                    logger.warning(f"录音状态: {status}")
+                n = min(frames, total - written)
+                if n <= 0:
+                    return
+                buf[written:written + n] = indata[:n]
+                written += n
+                loop.call_soon_threadsafe(blocks.put_nowait, (written - n, written))
+            
+            recorded = 0
+            speech_started = False
+            silence = 0
+            
+            with sd.InputStream(
                 samplerate=self.sample_rate,
                 channels=self.channels,
-                dtype=self.dtype
-            )
-            
-            # 添加进度条显示
-            for i in range(duration):
-                print(f"录音中: {'■' * (i+1)}{'□' * (duration-i-1)} {i+1}/{duration}秒", end='\r')
-                await asyncio.sleep(1)
+                dtype=self.dtype,
+                blocksize=self.VAD_BLOCK_SIZE,
+                callback=callback
+            ):
+                while recorded < total:
+                    start, recorded = await blocks.get()
+                    block = buf[start:recorded]
+                    
+                    # 添加进度条显示
+                    elapsed = min(recorded // self.sample_rate, duration)
+                    print(f"录音中: {'■' * elapsed}{'□' * (duration - elapsed)} {elapsed}/{duration}秒", end='\r')
+                    
+                    # 简单的能量检测：说话之后的连续静音视为一句话结束
+                    rms = np.sqrt(np.mean(block.astype(np.float32) ** 2))
+                    if rms >= self.VAD_THRESHOLD:
+                        speech_started = True
+                        silence = 0
+                    elif speech_started:
+                        silence += len(block)
+                        if silence >= self.VAD_SILENCE_SAMPLES:
+                            break
             
-            sd.wait()
             print("\n录音完成" + " " * 40)  # 清除进度条
             
-            return audio_data.tobytes()
+            if recorded == 0:
+                return None
+            # 返回缓冲区视图，避免再拷贝一次；下次录音前识别已经完成
+            audio = buf[:recorded]
+            return audio[:, 0] if self.channels == 1 else audio
         except Exception as e:
             logger.error(f"录音错误: {e}", exc_info=True)
             print("录音失败，请检查麦克风设置")
@@ -106,36 +174,78 @@ class CommandLineClient:
             logger.error("尝试播放空音频数据")
             return
             
-        temp_path = None
         try:
-            # 创建临时文件
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as tmp_file:
-                temp_path = tmp_file.name
-                self.temp_files.append(temp_path)
+            # 直接在内存中解码音频
+            data, sample_rate = sf.read(io.BytesIO(audio_data), dtype='float32', always_2d=True)
             
-            # 写入音频数据
-            with open(temp_path, 'wb') as f:
-                f.write(audio_data)
+            # 由音频线程的回调取数据，播放期间事件循环可以继续处理其他任务
+            loop = asyncio.get_running_loop()
+            finished = asyncio.Event()
+            position = 0
             
-            # 读取并播放音频
-            data, sample_rate = sf.read(temp_path)
-            sd.play(data, sample_rate)
-            sd.wait()
+            def callback(outdata, frames, time_info, status):
+                nonlocal position
+                chunk = data[position:position + frames]
+                outdata[:len(chunk)] = chunk
+                position += len(chunk)
+                if len(chunk) < frames:
+                    outdata[len(chunk):] = 0
+                    raise sd.CallbackStop
+            
+            with sd.OutputStream(
+                samplerate=sample_rate,
+                channels=data.shape[1],
+                dtype='float32',
+                callback=callback,
+                finished_callback=lambda: loop.call_soon_threadsafe(finished.set)
+            ):
+                await finished.wait()
             
         except Exception as e:
             logger.error(f"播放音频错误: {e}", exc_info=True)
             print("播放音频失败")
-        finally:
-            # 清理临时文件
-            if temp_path and os.path.exists(temp_path):
-                try:
-                    os.unlink(temp_path)
-                    self.temp_files.remove(temp_path)
-                except:
-                    pass
+    
+    async def speak_streaming(self, text: str) -> str:
+        """流式回复：逐句生成文本，同时合成并播放已生成的句子"""
+        sentence_queue: asyncio.Queue = asyncio.Queue(maxsize=self.PIPELINE_DEPTH)
+        audio_queue: asyncio.Queue = asyncio.Queue(maxsize=self.PIPELINE_DEPTH)
+        sentences = []
+        
+        async def generate():
+            try:
+                print("AI回复: ", end='', flush=True)
+                async for sentence in self.agent.stream_process_text(text):
+                    print(sentence, end='', flush=True)
+                    sentences.append(sentence)
+                    await sentence_queue.put(sentence)
+                print()
+            finally:
+                await sentence_queue.put(None)
+        
+        async def synthesize():
+            try:
+                while (sentence := await sentence_queue.get()) is not None:
+                    try:
+                        audio = await self.speech_processor.text_to_speech(sentence)
+                    except Exception as e:
+                        logger.error(f"语音合成错误: {e}", exc_info=True)
+                        continue
+                    await audio_queue.put(audio)
+            finally:
+                await audio_queue.put(None)
+        
+        async def play():
+            while (audio := await audio_queue.get()) is not None:
+                await self.play_audio(audio)
+        
+        await asyncio.gather(generate(), synthesize(), play())
+        return "".join(sentences)
     
     async def conversation_loop(self):
         """对话循环"""
+        # 用户选择模式、录音的同时在后台预热AI服务
+        self.warmup_task = asyncio.create_task(self.agent.warmup())
+        
         print("\n欢迎使用AI助手！")
         print("-------------------")
         print("按Ctrl+C退出")
@@ -148,13 +258,13 @@ class CommandLineClient:
                 print("2. 文字对话")
                 print("3. 退出程序")
                 
-                choice = input("\n请输入选项 (1/2/3): ").strip()
+                choice = (await ainput("\n请输入选项 (1/2/3): ")).strip()
                 
                 if choice == "1":
                     # 语音对话模式
                     duration = 5
                     try:
-                        custom_duration = input("录音时长(秒)，默认5秒。按回车使用默认值: ").strip()
+                        custom_duration = (await ainput("最长录音时长(秒)，默认5秒。按回车使用默认值: ")).strip()
                         if custom_duration:
                             duration = int(custom_duration)
                     except ValueError:
@@ -162,7 +272,7 @@ class CommandLineClient:
                         duration = 5
                     
                     audio_data = await self.record_audio(duration)
-                    if not audio_data:
+                    if audio_data is None:
                         continue
                     
                     print("正在识别语音...")
@@ -175,23 +285,14 @@ class CommandLineClient:
                         
                         print("正在生成回复...")
                         start_time = time.time()
-                        response = await self.agent.process_text(text)
-                        logger.info(f"生成回复耗时: {time.time() - start_time:.2f}秒")
-                        print(f"AI回复: {response}")
-                        
-                        print("正在生成语音...")
-                        start_time = time.time()
-                        audio_response = await self.speech_processor.text_to_speech(response)
-                        logger.info(f"语音合成耗时: {time.time() - start_time:.2f}秒")
-                        
-                        print("播放回复...")
-                        await self.play_audio(audio_response)
+                        await self.speak_streaming(text)
+                        logger.info(f"回复及播放总耗时: {time.time() - start_time:.2f}秒")
                     else:
                         print("语音识别失败或未检测到语音，请重试")
                 
                 elif choice == "2":
                     # 文字对话模式
-                    text = input("\n请输入消息: ").strip()
+                    text = (await ainput("\n请输入消息: ")).strip()
                     if not text:
                         continue
                     
@@ -202,7 +303,7 @@ class CommandLineClient:
                     print(f"AI回复: {response}")
                     
                     # 询问是否需要播放语音
-                    play_audio = input("是否播放语音回复? (y/n): ").strip().lower()
+                    play_audio = (await ainput("是否播放语音回复? (y/n): ")).strip().lower()
                     if play_audio in ('y', 'yes', '是'):
                         print("正在生成语音...")
                         start_time = time.time()
@@ -229,6 +330,7 @@ class CommandLineClient:
                 await asyncio.sleep(1)
 
 async def main():
+    client = None
     try:
         client = CommandLineClient()
         await client.conversation_loop()
@@ -237,6 +339,8 @@ async def main():
         print(f"程序崩溃: {e}")
     finally:
         print("正在清理资源...")
+        if client:
+            await client.agent.aclose()
 
 if __name__ == "__main__":
     asyncio.run(main())
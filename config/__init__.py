@@ -6,6 +6,7 @@ from .settings import (
     API_CONFIG,
     USER_CONFIG,
     SPEECH,
+    LLM_CACHE,
     MODEL_CONFIG
 )
 
@@ -17,5 +18,6 @@ __all__ = [
     'API_CONFIG',
     'USER_CONFIG',
     'SPEECH',
+    'LLM_CACHE',
     'MODEL_CONFIG'
 ] 
\ No newline at end of file
@@ -1,4 +1,8 @@
+from collections.abc import Mapping
+from dataclasses import dataclass, fields
+import functools
 from pathlib import Path
+from typing import Any, Dict, Iterator, Tuple
 import os
 
 # 基础路径配置
@@ -23,58 +27,189 @@ SERVER_CONFIG = {
     }
 }
 
+class _FrozenConfig(Mapping):
+    """冻结配置基类
+
+    子类均为 frozen dataclass，并显式声明 __slots__（兼容 Python 3.8，无法使用 slots=True），
+    属性访问直接走槽位。同时实现只读 Mapping 接口（下标、in、迭代、items()、**config），
+    便于旧代码按字典方式继续使用。
+    """
+    __slots__ = ()
+    # 由属性按需计算、但同样支持字典访问的键
+    _computed_keys = ()
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self.keys():
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys())
+
+    def __len__(self) -> int:
+        return len(self.__slots__) + len(self._computed_keys)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.__slots__ or key in self._computed_keys
+
+    def keys(self) -> Tuple[str, ...]:
+        return self.__slots__ + self._computed_keys
+
+    def to_dict(self) -> Dict[str, Any]:
+        """递归转换为普通字典（用于JSON序列化）"""
+        result = {}
+        for name in [f.name for f in fields(self)] + list(self._computed_keys):
+            value = getattr(self, name)
+            if isinstance(value, _FrozenConfig):
+                value = value.to_dict()
+            elif isinstance(value, tuple):
+                value = list(value)
+            result[name] = value
+        return result
+
+@dataclass(frozen=True)
+class ModelKwargs(_FrozenConfig):
+    """大模型采样参数"""
+    __slots__ = ('temperature', 'max_tokens', 'top_p')
+    temperature: float
+    max_tokens: int
+    top_p: float
+
+@dataclass(frozen=True)
+class DeepSeekConfig(_FrozenConfig):
+    """DeepSeek API配置"""
+    __slots__ = ('api_key', 'api_base', 'model', 'model_kwargs')
+    api_key: str
+    api_base: str
+    model: str
+    model_kwargs: ModelKwargs
+
+@dataclass(frozen=True)
+class ApiConfig(_FrozenConfig):
+    """API配置"""
+    __slots__ = ('deepseek',)
+    deepseek: DeepSeekConfig
+
 # API配置
-API_CONFIG = {
-    'deepseek': {
-        'api_key': os.getenv('DEEPSEEK_API_KEY', ''),
-        'api_base': 'https://api.deepseek.com/v1',
-        'model': 'deepseek-chat',
-        'model_kwargs': {
-            'temperature': 0.7,
-            'max_tokens': 2000,
-            'top_p': 0.9
-        }
-    }
-}
+API_CONFIG = ApiConfig(
+    deepseek=DeepSeekConfig(
+        api_key=os.getenv('DEEPSEEK_API_KEY', ''),
+        api_base='https://api.deepseek.com/v1',
+        model='deepseek-chat',
+        model_kwargs=ModelKwargs(
+            temperature=0.7,
+            max_tokens=2000,
+            top_p=0.9
+        )
+    )
+)
+
+@dataclass(frozen=True)
+class UserProfile(_FrozenConfig):
+    """用户画像"""
+    __slots__ = ('name', 'age', 'gender', 'personality', 'social')
+    name: str
+    age: int
+    gender: str
+    personality: str
+    social: str
+
+@dataclass(frozen=True)
+class InteractionStyle(_FrozenConfig):
+    """互动风格"""
+    __slots__ = ('tone', 'goals', 'rules')
+    tone: str
+    goals: Tuple[str, ...]
+    rules: Tuple[str, ...]
+
+@dataclass(frozen=True)
+class UserConfig(_FrozenConfig):
+    """用户配置"""
+    __slots__ = ('profile', 'interaction_style')
+    profile: UserProfile
+    interaction_style: InteractionStyle
 
 # 用户配置
-USER_CONFIG = {
-    'profile': {
-        'name': "帅帅",
-        'age': 5,
-        'gender': "男生",
-        'personality': "腼腆害羞",
-        'social': "没有什么朋友"
-    },
-    'interaction_style': {
-        'tone': "温柔耐心",
-        'goals': [
+USER_CONFIG = UserConfig(
+    profile=UserProfile(
+        name="帅帅",
+        age=5,
+        gender="男生",
+        personality="腼腆害羞",
+        social="没有什么朋友"
+    ),
+    interaction_style=InteractionStyle(
+        tone="温柔耐心",
+        goals=(
             "多鼓励他表达自己",
             "帮助他建立自信",
             "引导他学会交朋友"
-        ],
-        'rules': [
+        ),
+        rules=(
             "说话要简单易懂",
             "多用具体的例子",
             "给予积极的反馈",
             "保持耐心和包容"
-        ]
-    }
-}
+        )
+    )
+)
 
 # 语音配置
 SPEECH = {
     'voice': "zh-CN-XiaoxiaoNeural",  # Edge TTS 的声音
+    'tts_cache_dir': DATA_DIR / "tts_cache",  # 语音合成缓存目录
+    'tts_cache_size': 200 * 1024 * 1024  # 语音合成缓存上限 200MB
+}
+
+# 对话回复缓存配置（按完整请求消息精确匹配，不做语义匹配）
+LLM_CACHE = {
+    'dir': DATA_DIR / "llm_cache",
+    'size_limit': 100 * 1024 * 1024,  # 缓存上限 100MB
+    'expire': 7 * 24 * 3600  # 7天后过期
 }
 
+@functools.lru_cache(maxsize=1)
+def _detect_whisper_device() -> str:
+    """检测是否有可用的CUDA设备（首次访问时才导入ctranslate2，避免拖慢导入配置的进程）"""
+    try:
+        import ctranslate2
+        return "cuda" if ctranslate2.get_cuda_device_count() > 0 else "cpu"
+    except ImportError:
+        return "cpu"
+
+@dataclass(frozen=True)
+class WhisperConfig(_FrozenConfig):
+    """Whisper模型配置"""
+    __slots__ = ('path', 'local_path', 'model_size', 'language', 'offline')
+    _computed_keys = ('device', 'compute_type')
+    path: str
+    local_path: str
+    model_size: str
+    language: str
+    offline: bool
+
+    @property
+    def device(self) -> str:
+        return _detect_whisper_device()
+
+    @property
+    def compute_type(self) -> str:
+        # CPU 使用 int8 量化，GPU 使用 int8 权重 + float16 计算
+        return "int8_float16" if self.device == "cuda" else "int8"
+
+@dataclass(frozen=True)
+class ModelConfig(_FrozenConfig):
+    """模型配置"""
+    __slots__ = ('whisper',)
+    whisper: WhisperConfig
+
 # 模型配置
-MODEL_CONFIG = {
-    'whisper': {
-        'path': '/Users/alex/AI/AI_toy/models',
-        'local_path': '/Users/alex/AI/AI_toy/models',
-        'device': "cpu",
-        'compute_type': "float32",
-        'language': 'zh',
-        'offline': True
-    }
-} 
\ No newline at end of file
+MODEL_CONFIG = ModelConfig(
+    whisper=WhisperConfig(
+        path='/Users/alex/AI/AI_toy/models',
+        local_path='/Users/alex/AI/AI_toy/models',
+        model_size="small",  # 儿童日常对话使用small即可，large模型延迟过高
+        language='zh',
+        offline=True
+    )
+)
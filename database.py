@@ -1,7 +1,10 @@
 import sqlite3
+import threading
+import atexit
+from collections.abc import Mapping
 from datetime import datetime
 from typing import List, Dict
-import json
+import orjson
 from pathlib import Path
 from config.settings import DATABASE
 import logging
@@ -9,21 +12,58 @@ import logging
 # 配置日志
 logger = logging.getLogger(__name__)
 
+_UNSET = object()
+
+class LazyConversation(Mapping):
+    """对话记录的只读字典视图，topics 字段在首次访问时才解析JSON"""
+    __slots__ = ('_row', '_topics')
+    
+    def __init__(self, row: sqlite3.Row):
+        self._row = row
+        self._topics = _UNSET
+    
+    def __getitem__(self, key):
+        if key == 'topics':
+            if self._topics is _UNSET:
+                raw = self._row['topics']
+                self._topics = orjson.loads(raw) if raw else []
+            return self._topics
+        try:
+            return self._row[key]
+        except IndexError:
+            raise KeyError(key) from None
+    
+    def __iter__(self):
+        return iter(self._row.keys())
+    
+    def __len__(self):
+        return len(self._row)
+    
+    def __repr__(self):
+        return repr(dict(self))
+
 class MemoryDB:
     def __init__(self):
         self.db_path = DATABASE['path']
         # 确保目录存在
         self.db_path.parent.mkdir(exist_ok=True)
+        
+        # 整个实例共用一个连接，所有操作通过锁串行化
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('PRAGMA temp_store=MEMORY')
+        self._conn.execute('PRAGMA mmap_size=268435456')
+        atexit.register(self.close)
+        
         self.create_tables()
     
-    def _get_connection(self):
-        """获取数据库连接"""
-        return sqlite3.connect(self.db_path)
-    
     def create_tables(self):
         """创建必要的数据库表"""
         try:
-            with self._get_connection() as conn:
+            with self._lock, self._conn as conn:
                 cursor = conn.cursor()
                 # 创建对话记录表
                 cursor.execute('''
@@ -99,39 +139,121 @@ class MemoryDB:
                 )
                 ''')
                 
-                # 添加索引以提高性能
+                # 添加索引以提高性能（与查询条件和排序字段对应）
                 cursor.execute('CREATE INDEX IF NOT EXISTS idx_conv_timestamp ON conversations(timestamp)')
-                cursor.execute('CREATE INDEX IF NOT EXISTS idx_conv_topics ON conversations(topics)')
-                cursor.execute('CREATE INDEX IF NOT EXISTS idx_kb_topic ON knowledge_base(topic)')
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_conv_session_ts ON conversations(session_id, timestamp DESC)')
+                # add_knowledge 按 topic = ? AND content = ? 精确查找
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_kb_topic_content ON knowledge_base(topic, content)')
+                # get_knowledge 的 topic LIKE '%...%' 无法走索引，按排序字段建索引，
+                # 让查询按顺序扫描并在取满 LIMIT 条后停止，不再需要临时排序
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_kb_freq_conf ON knowledge_base(frequency DESC, confidence DESC)')
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_emotion_timestamp ON emotion_records(timestamp)')
+                # topics 存的是JSON文本，单列索引无法用于查询；其余为被上面的索引取代的旧索引
+                cursor.execute('DROP INDEX IF EXISTS idx_conv_topics')
+                cursor.execute('DROP INDEX IF EXISTS idx_kb_topic')
+                cursor.execute('DROP INDEX IF EXISTS idx_kb_topic_freq')
+                cursor.execute('DROP INDEX IF EXISTS idx_kb_freq')
+                # 只在统计信息缺失或过期时才分析，避免每次启动都全表ANALYZE
+                cursor.execute('PRAGMA optimize')
                 
-                conn.commit()
+                self._fts_enabled = self._create_fts(cursor)
         except Exception as e:
             logger.error(f"创建数据库表出错: {e}", exc_info=True)
             raise
     
+    def _create_fts(self, cursor) -> bool:
+        """创建对话全文索引表及同步触发器
+
+        使用 trigram 分词，中文按三字滑窗建立索引，效果等同于 LIKE '%kw%'
+        但无需全表扫描。SQLite 不支持 FTS5/trigram 时返回 False。
+        """
+        try:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'conv_fts'")
+            exists = cursor.fetchone() is not None
+            
+            cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS conv_fts USING fts5(
+                user_input, ai_response,
+                content='conversations', content_rowid='id',
+                tokenize='trigram'
+            )
+            ''')
+            cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS conv_fts_ai AFTER INSERT ON conversations BEGIN
+                INSERT INTO conv_fts(rowid, user_input, ai_response)
+                VALUES (new.id, new.user_input, new.ai_response);
+            END
+            ''')
+            cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS conv_fts_ad AFTER DELETE ON conversations BEGIN
+                INSERT INTO conv_fts(conv_fts, rowid, user_input, ai_response)
+                VALUES ('delete', old.id, old.user_input, old.ai_response);
+            END
+            ''')
+            cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS conv_fts_au AFTER UPDATE ON conversations BEGIN
+                INSERT INTO conv_fts(conv_fts, rowid, user_input, ai_response)
+                VALUES ('delete', old.id, old.user_input, old.ai_response);
+                INSERT INTO conv_fts(rowid, user_input, ai_response)
+                VALUES (new.id, new.user_input, new.ai_response);
+            END
+            ''')
+            
+            # 新建索引时为已有的对话记录建立索引
+            if not exists:
+                cursor.execute("INSERT INTO conv_fts(conv_fts) VALUES ('rebuild')")
+            return True
+        except sqlite3.OperationalError as e:
+            logger.warning(f"全文索引不可用，搜索将使用LIKE: {e}")
+            return False
+    
     def add_conversation(self, user_input: str, ai_response: str, 
                         emotion: str = None, topics: List[str] = None,
                         context: str = None, session_id: str = None):
         """添加对话记录"""
         try:
-            with self._get_connection() as conn:
+            with self._lock, self._conn as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                 INSERT INTO conversations 
                 (user_input, ai_response, emotion, topics, context, session_id)
                 VALUES (?, ?, ?, ?, ?, ?)
                 ''', (user_input, ai_response, emotion, 
-                     json.dumps(topics or []), context, session_id))
-                conn.commit()
+                     orjson.dumps(topics or []).decode(), context, session_id))
                 return cursor.lastrowid
         except Exception as e:
             logger.error(f"添加对话记录失败: {e}", exc_info=True)
             return None
-    
-    def get_recent_conversations(self, limit: int = 5, session_id: str = None) -> List[Dict]:
+
+    def add_conversations_bulk(self, conversations: List[Dict]) -> int:
+        """批量添加对话记录（单个事务），用于导入历史记录等场景
+
+        每条记录的键与 add_conversation 的参数相同，返回写入的条数
+        """
+        rows = [
+            (c['user_input'], c['ai_response'], c.get('emotion'),
+             orjson.dumps(c.get('topics') or []).decode(), c.get('context'), c.get('session_id'))
+            for c in conversations
+        ]
+        if not rows:
+            return 0
+
+        try:
+            with self._lock, self._conn as conn:
+                conn.executemany('''
+                INSERT INTO conversations
+                (user_input, ai_response, emotion, topics, context, session_id)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ''', rows)
+                return len(rows)
+        except Exception as e:
+            logger.error(f"批量添加对话记录失败: {e}", exc_info=True)
+            return 0
+
+    def get_recent_conversations(self, limit: int = 5, session_id: str = None) -> List[LazyConversation]:
         """获取最近的对话记录"""
         try:
-            with self._get_connection() as conn:
+            with self._lock, self._conn as conn:
                 cursor = conn.cursor()
                 
                 query = '''
@@ -149,18 +271,7 @@ class MemoryDB:
                 
                 cursor.execute(query, params)
                 
-                conversations = []
-                for row in cursor.fetchall():
-                    conversations.append({
-                        'timestamp': row[0],
-                        'user_input': row[1],
-                        'ai_response': row[2],
-                        'emotion': row[3],
-                        'topics': json.loads(row[4]) if row[4] else [],
-                        'context': row[5],
-                        'session_id': row[6]
-                    })
-                return conversations
+                return [LazyConversation(row) for row in cursor.fetchall()]
         except Exception as e:
             logger.error(f"获取对话记录失败: {e}", exc_info=True)
             return []
@@ -168,14 +279,23 @@ class MemoryDB:
     def search_memories(self, keyword: str) -> List[Dict]:
         """搜索记忆"""
         try:
-            with self._get_connection() as conn:
+            with self._lock, self._conn as conn:
                 cursor = conn.cursor()
-                cursor.execute('''
-                SELECT timestamp, user_input, ai_response, context
-                FROM conversations
-                WHERE user_input LIKE ? OR ai_response LIKE ?
-                ORDER BY timestamp DESC
-                ''', (f'%{keyword}%', f'%{keyword}%'))
+                # trigram 索引至少需要3个字符，更短的关键词仍使用LIKE
+                if self._fts_enabled and len(keyword) >= 3:
+                    cursor.execute('''
+                    SELECT c.timestamp, c.user_input, c.ai_response, c.context
+                    FROM conv_fts f JOIN conversations c ON c.id = f.rowid
+                    WHERE conv_fts MATCH ?
+                    ORDER BY c.timestamp DESC
+                    ''', ('"' + keyword.replace('"', '""') + '"',))
+                else:
+                    cursor.execute('''
+                    SELECT timestamp, user_input, ai_response, context
+                    FROM conversations
+                    WHERE user_input LIKE ? OR ai_response LIKE ?
+                    ORDER BY timestamp DESC
+                    ''', (f'%{keyword}%', f'%{keyword}%'))
                 
                 return [{'timestamp': row[0], 'user_input': row[1], 
                          'ai_response': row[2], 'context': row[3]}
@@ -187,7 +307,7 @@ class MemoryDB:
     def add_knowledge(self, topic: str, content: str, source: str, confidence: float = 0.8):
         """添加知识条目"""
         try:
-            with self._get_connection() as conn:
+            with self._lock, self._conn as conn:
                 cursor = conn.cursor()
                 
                 # 检查是否已存在该知识
@@ -211,7 +331,6 @@ class MemoryDB:
                     VALUES (?, ?, ?, ?)
                     ''', (topic, content, source, confidence))
                 
-                conn.commit()
                 return cursor.lastrowid if not existing else existing[0]
         except Exception as e:
             logger.error(f"添加知识失败: {e}", exc_info=True)
@@ -220,7 +339,7 @@ class MemoryDB:
     def get_knowledge(self, topic: str = None, limit: int = 10) -> List[Dict]:
         """获取知识"""
         try:
-            with self._get_connection() as conn:
+            with self._lock, self._conn as conn:
                 cursor = conn.cursor()
                 
                 query = 'SELECT topic, content, source, confidence, frequency FROM knowledge_base'
@@ -243,8 +362,11 @@ class MemoryDB:
             return []
     
     def close(self):
-        """关闭连接（已废弃，使用上下文管理器代替）"""
-        pass
+        """关闭数据库连接"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
 
 def init_database():
     """初始化数据库"""
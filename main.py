@@ -34,15 +34,17 @@ def init_directories():
         ssl_dir.mkdir(exist_ok=True)
         logger.info(f"SSL目录已初始化: {ssl_dir}")
         
-        # 移动证书文件到 ssl 目录
-        key_file = BASE_DIR / "key.pem"
-        cert_file = BASE_DIR / "cert.pem"
-        if key_file.exists():
-            key_file.rename(ssl_dir / "key.pem")
+        # 移动证书文件到 ssl 目录（文件不存在时直接跳过，无需先检查）
+        try:
+            (BASE_DIR / "key.pem").rename(ssl_dir / "key.pem")
             logger.info("密钥文件已移动到SSL目录")
-        if cert_file.exists():
-            cert_file.rename(ssl_dir / "cert.pem")
+        except FileNotFoundError:
+            pass
+        try:
+            (BASE_DIR / "cert.pem").rename(ssl_dir / "cert.pem")
             logger.info("证书文件已移动到SSL目录")
+        except FileNotFoundError:
+            pass
             
     except Exception as e:
         logger.error(f"初始化目录时出错: {e}", exc_info=True)
@@ -80,4 +82,10 @@ async def main():
         sys.exit(1)
 
 if __name__ == "__main__":
+    # 优先使用 uvloop 事件循环（Windows 不支持，退回默认事件循环）
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        logger.info("未安装uvloop，使用默认事件循环")
     asyncio.run(main()) 
\ No newline at end of file
@@ -0,0 +1,27 @@
+"""句子切分测试"""
+from app.agent.companion_agent import split_sentences
+
+
+def test_consecutive_terminators_stay_in_one_sentence():
+    assert split_sentences("真的吗？！太棒了！！", final=True) == (["真的吗？！", "太棒了！！"], "")
+
+
+def test_repeated_ascii_terminators():
+    assert split_sentences("哇!!!", final=True) == (["哇!!!"], "")
+
+
+def test_trailing_fragment_without_terminator():
+    assert split_sentences("你好。我是小美", final=True) == (["你好。", "我是小美"], "")
+    # 流式分块中未结束的部分留在剩余文本里
+    assert split_sentences("你好。我是小美") == (["你好。"], "我是小美")
+
+
+def test_sentence_at_buffer_end_is_held_back():
+    # 下一个分块可能紧跟着更多标点，不能提前切出
+    assert split_sentences("真的吗？") == ([], "真的吗？")
+    assert split_sentences("真的吗？！太棒") == (["真的吗？！"], "太棒")
+
+
+def test_punctuation_only_fragments_are_not_yielded():
+    assert split_sentences("！开头？", final=True) == (["开头？"], "")
+    assert split_sentences("！！", final=True) == ([], "")
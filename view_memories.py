@@ -1,42 +1,77 @@
+import atexit
+import functools
 import sqlite3
+import sys
 from pathlib import Path
 
+FETCH_BATCH_SIZE = 512
+
+# 预先绑定的输出模板，循环中直接按列名填充
+_fmt_conversation = "\n时间: {timestamp}\n用户: {user_input}\n小美: {ai_response}\n".format_map
+_fmt_knowledge = "\n主题: {topic}\n内容: {content}\n提及次数: {frequency}\n".format_map
+_fmt_emotion = "\n时间: {timestamp}\n情绪: {emotion}\n触发: {trigger}\n".format_map
+
+@functools.lru_cache(maxsize=1)
+def _get_conn():
+    """获取模块级缓存的只读数据库连接，进程退出时关闭"""
+    db_path = (Path(__file__).parent / "data" / "memories.db").resolve()
+    # 以只读URI模式打开；不使用 immutable=1，因为程序运行时仍可能在写入WAL，
+    # immutable 会忽略WAL文件导致看不到最新的对话
+    conn = sqlite3.connect(
+        f"{db_path.as_uri()}?mode=ro",
+        uri=True,
+        isolation_level=None,
+        check_same_thread=False
+    )
+    conn.row_factory = sqlite3.Row
+    # 加大页缓存、启用内存映射
+    conn.executescript(
+        "PRAGMA cache_size=-20000;"
+        "PRAGMA temp_store=MEMORY;"
+        "PRAGMA mmap_size=134217728;"
+    )
+    atexit.register(conn.close)
+    return conn
+
 def view_memories():
-    # 连接数据库
-    db_path = Path(__file__).parent / "data" / "memories.db"
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+    cursor = _get_conn().cursor()
+    
+    # 先把所有内容拼到列表里，最后一次性写出，避免逐行print
+    parts = []
     
     # 查看对话历史
-    print("\n=== 最近的对话 ===")
+    parts.append("\n=== 最近的对话 ===\n")
     cursor.execute('''
         SELECT timestamp, user_input, ai_response 
         FROM conversations 
         ORDER BY timestamp DESC 
         LIMIT 5
     ''')
-    for row in cursor.fetchall():
-        print(f"\n时间: {row[0]}")
-        print(f"用户: {row[1]}")
-        print(f"小美: {row[2]}")
+    parts.extend(map(_fmt_conversation, cursor))
     
     # 查看知识库
-    print("\n=== 知识库内容 ===")
-    cursor.execute('SELECT topic, content, frequency FROM knowledge_base')
-    for row in cursor.fetchall():
-        print(f"\n主题: {row[0]}")
-        print(f"内容: {row[1]}")
-        print(f"提及次数: {row[2]}")
+    parts.append("\n=== 知识库内容（最常提及的20条） ===\n")
+    cursor.execute('''
+        SELECT topic, content, frequency 
+        FROM knowledge_base 
+        ORDER BY frequency DESC 
+        LIMIT 20
+    ''')
+    parts.extend(map(_fmt_knowledge, cursor))
     
     # 查看情感记录
-    print("\n=== 情感记录 ===")
-    cursor.execute('SELECT timestamp, emotion, trigger FROM emotion_records')
-    for row in cursor.fetchall():
-        print(f"\n时间: {row[0]}")
-        print(f"情绪: {row[1]}")
-        print(f"触发: {row[2]}")
+    parts.append("\n=== 情感记录 ===\n")
+    cursor.execute('SELECT timestamp, emotion, trigger FROM emotion_records ORDER BY timestamp')
+    # 情感记录没有条数上限，按批取出以减少逐行调用的开销
+    while True:
+        rows = cursor.fetchmany(FETCH_BATCH_SIZE)
+        if not rows:
+            break
+        parts.extend(map(_fmt_emotion, rows))
+    
+    cursor.close()
     
-    conn.close()
+    sys.stdout.write("".join(parts))
 
 if __name__ == "__main__":
-    view_memories() 
\ No newline at end of file
+    view_memories()